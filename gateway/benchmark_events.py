@@ -0,0 +1,62 @@
+import argparse
+import os
+import time
+
+from events import EventEncoder, EventBatcher, CONTENT_MODES
+
+
+def legacy_encode(response, node, trace, trace_id, time_taken):
+    # Event encoding used by the gateway before EventEncoder
+    escaped_response = response.replace("\n", "\\n").replace("\r", "\\r").replace("\"", "\\\"")
+    return f'data: {{"content": "{escaped_response}", "node": "nabu-{node}", "trace": "{trace}", "trace_id": "{trace_id}", "time_taken": "{time_taken:.2f}s"}}\n\n'
+
+
+def make_results(ncids, block_size):
+    results = []
+    for i in range(ncids):
+        content = os.urandom(block_size // 2).hex()
+        # Add characters that need escaping
+        content = content[:16] + "\n\"\\\t" + content[16:]
+        trace = i % 10 == 0
+        trace_id = os.urandom(16).hex() if trace else "N/A"
+        results.append((content, i % 10, trace, trace_id, 0.05))
+    return results
+
+
+def run(name, results, encode, batch_size):
+    batcher = EventBatcher(max_events=batch_size, flush_interval=float("inf"))
+    writes = 0
+    bytes_sent = 0
+    start = time.perf_counter()
+    for result in results:
+        chunk = batcher.add(encode(*result))
+        if chunk:
+            writes += 1
+            bytes_sent += len(chunk.encode("utf-8"))
+    chunk = batcher.flush()
+    if chunk:
+        writes += 1
+        bytes_sent += len(chunk.encode("utf-8"))
+    elapsed = time.perf_counter() - start
+    print(f"{name:<12} {len(results) / elapsed:>14,.0f} events/s {bytes_sent:>14,} bytes {writes:>8,} writes")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cids", type=int, default=10000)
+    parser.add_argument("--block-size", type=int, default=16 * 1024)
+    parser.add_argument("--max-content-bytes", type=int, default=1024)
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    results = make_results(args.cids, args.block_size)
+    print(f"Encoding {args.cids} events with {args.block_size}-byte blocks")
+
+    run("legacy", results, legacy_encode, args.batch_size)
+    for mode in CONTENT_MODES:
+        encoder = EventEncoder(content_mode=mode, max_content_bytes=args.max_content_bytes)
+        run(mode, results, encoder.content_event, args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
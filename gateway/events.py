@@ -0,0 +1,98 @@
+import hashlib
+import time
+
+import orjson
+
+# How block content is included in each event
+CONTENT_MODE_FULL = "full"
+CONTENT_MODE_TRUNCATE = "truncate"
+CONTENT_MODE_HASH = "hash"
+CONTENT_MODES = (CONTENT_MODE_FULL, CONTENT_MODE_TRUNCATE, CONTENT_MODE_HASH)
+
+
+class EventEncoder:
+    """
+    Serializes gateway results as server-sent events.
+
+    Every event is a single valid JSON object. Block content is sent in full,
+    cut to max_content_bytes (content_mode="truncate"), or replaced with its
+    SHA-256 digest (content_mode="hash"); the last two only kick in for
+    blocks larger than max_content_bytes.
+    """
+
+    def __init__(self, content_mode=CONTENT_MODE_FULL, max_content_bytes=64 * 1024):
+        if content_mode not in CONTENT_MODES:
+            raise ValueError(f"Unknown content mode: {content_mode}")
+        self.content_mode = content_mode
+        self.max_content_bytes = max_content_bytes
+
+    def encode(self, event):
+        return "data: " + orjson.dumps(event).decode("utf-8") + "\n\n"
+
+    def content_event(self, content, node, trace, trace_id, time_taken):
+        event = {"content": content}
+        if self.content_mode != CONTENT_MODE_FULL:
+            raw = content.encode("utf-8")
+            if len(raw) > self.max_content_bytes:
+                if self.content_mode == CONTENT_MODE_TRUNCATE:
+                    event["content"] = raw[:self.max_content_bytes].decode("utf-8", errors="ignore")
+                    event["truncated"] = True
+                else:
+                    event["content"] = ""
+                    event["content_hash"] = hashlib.sha256(raw).hexdigest()
+                event["content_size"] = len(raw)
+        event["node"] = f"nabu-{node}"
+        event["trace"] = str(trace)
+        event["trace_id"] = trace_id
+        event["time_taken"] = _format_time_taken(time_taken)
+        return self.encode(event)
+
+    def error_event(self, error, node, trace, trace_id, time_taken):
+        return self.encode({
+            "error": str(error),
+            "node": f"nabu-{node}" if node is not None else "N/A",
+            "trace": str(bool(trace)),
+            "trace_id": trace_id if trace_id is not None else "N/A",
+            "time_taken": _format_time_taken(time_taken),
+        })
+
+
+class EventBatcher:
+    """
+    Groups encoded events so that several completed results go out in one
+    flushed write. add() returns the pending chunk once max_events have been
+    collected, and None otherwise. The batcher has no timer of its own: the
+    caller checks is_due() periodically and calls flush() so that no event
+    waits much longer than flush_interval seconds.
+    """
+
+    def __init__(self, max_events=32, flush_interval=0.1):
+        self.max_events = max_events
+        self.flush_interval = flush_interval
+        self._pending = []
+        self._oldest_pending = None
+
+    def add(self, encoded_event):
+        if not self._pending:
+            self._oldest_pending = time.monotonic()
+        self._pending.append(encoded_event)
+        if len(self._pending) >= self.max_events:
+            return self.flush()
+        return None
+
+    def is_due(self):
+        return bool(self._pending) and time.monotonic() - self._oldest_pending >= self.flush_interval
+
+    def flush(self):
+        if not self._pending:
+            return None
+        chunk = "".join(self._pending)
+        self._pending = []
+        self._oldest_pending = None
+        return chunk
+
+
+def _format_time_taken(time_taken):
+    if time_taken is None or time_taken == "N/A":
+        return "N/A"
+    return f"{time_taken:.2f}s"
@@ -0,0 +1,108 @@
+import hashlib
+import heapq
+import threading
+import time
+
+# Largest value of the 64-bit hash used for sampling decisions
+MAX_HASH = 2**64
+
+
+def hash_cid(cid):
+    # Stable 64-bit hash of a CID, so the same CID gets the same decision across runs
+    digest = hashlib.blake2b(cid.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+class AdaptiveSampler:
+    """
+    Head sampler that keeps the number of traced requests close to a target
+    traces-per-second budget.
+
+    The sampling rate is recomputed by update() from the request throughput
+    observed since the last update, and is scaled down further when the span
+    builder reports that its queue of pending traces is above max_queue_depth.
+    Decisions are made by comparing a hash of the CID against the current rate,
+    so they are reproducible: a CID sampled at some rate is also sampled at any
+    higher rate. Since a whole batch is sampled at once, max_traces_per_batch
+    caps how many CIDs of a single burst are traced.
+    """
+
+    def __init__(self, target_traces_per_sec, initial_rate, min_rate=0.001, max_rate=1.0, smoothing=0.5, max_queue_depth=1000, max_traces_per_batch=None):
+        self.target_traces_per_sec = target_traces_per_sec
+        self.max_traces_per_batch = max_traces_per_batch
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.smoothing = smoothing
+        self.max_queue_depth = max_queue_depth
+
+        self.initial_rate = initial_rate
+        self.rate = initial_rate
+        self.queue_depth = 0
+        self.requests_per_sec = None
+
+        self._requests_seen = 0
+        self._last_update = time.monotonic()
+        self._lock = threading.Lock()
+
+    def sample(self, cid_list):
+        """
+        Return the set of indices in cid_list that should be traced.
+
+        At least one CID is traced per non-empty batch: if no CID falls under
+        the current rate, the one with the smallest hash is picked. If more
+        than max_traces_per_batch fall under it, only the ones with the
+        smallest hashes are kept.
+        """
+        self.record_requests(len(cid_list))
+        threshold = self.rate * MAX_HASH
+        candidates = []
+        min_idx, min_hash = -1, MAX_HASH
+        for i, cid in enumerate(cid_list):
+            cid_hash = hash_cid(cid)
+            if cid_hash < threshold:
+                candidates.append((cid_hash, i))
+            if cid_hash < min_hash:
+                min_idx, min_hash = i, cid_hash
+        if not candidates:
+            return {min_idx} if min_idx != -1 else set()
+        if self.max_traces_per_batch is not None and len(candidates) > self.max_traces_per_batch:
+            candidates = heapq.nsmallest(self.max_traces_per_batch, candidates)
+        return {i for _, i in candidates}
+
+    def record_requests(self, count):
+        with self._lock:
+            self._requests_seen += count
+
+    def set_queue_depth(self, depth):
+        self.queue_depth = depth
+
+    def update(self):
+        # Recompute the sampling rate from the throughput observed since the last update
+        with self._lock:
+            now = time.monotonic()
+            elapsed = now - self._last_update
+            if elapsed <= 0:
+                return self.rate
+            observed = self._requests_seen / elapsed
+            self._requests_seen = 0
+            self._last_update = now
+
+            # Keep the last throughput estimate while idle, so the rate does
+            # not climb towards max_rate before the next burst
+            if observed > 0:
+                if self.requests_per_sec is None:
+                    self.requests_per_sec = observed
+                else:
+                    self.requests_per_sec = self.smoothing * observed + (1 - self.smoothing) * self.requests_per_sec
+
+            if self.requests_per_sec:
+                rate = self.target_traces_per_sec / self.requests_per_sec
+            else:
+                rate = self.initial_rate
+
+            # Back off when the span builder is falling behind
+            if self.queue_depth > self.max_queue_depth:
+                rate *= self.max_queue_depth / self.queue_depth
+
+            self.rate = min(self.max_rate, max(self.min_rate, rate))
+            return self.rate
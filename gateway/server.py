@@ -1,10 +1,12 @@
 from flask import Flask, request, jsonify, render_template, Response
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
 import requests
-import random
 from google.cloud import firestore
+import os
 import time
 import threading
+from sampler import AdaptiveSampler
+from events import EventEncoder, EventBatcher, CONTENT_MODE_FULL
 
 app = Flask(__name__)
 
@@ -25,10 +27,37 @@ IPFS_URL = [
     "http://10.200.0.2:5000",  # nabu-9
 ]
 
+# Node addresses can be overridden with a comma-separated NABU_IPFS_URLS
+if os.environ.get("NABU_IPFS_URLS"):
+    IPFS_URL = os.environ["NABU_IPFS_URLS"].split(",")
+
 IPFS_NODE_IDX = 0
-SAMPLE_RATE = 10 # We will sample (1 / SAMPLE_RATE) of all CIDs for tracing
+SAMPLE_RATE = 10 # We will initially sample (1 / SAMPLE_RATE) of all CIDs for tracing
+TRACE_BUDGET_PER_SEC = 5 # Target number of traced requests per second
+SAMPLER_UPDATE_INTERVAL_IN_SEC = 5
 TIMEOUT_IN_SEC = 15
 
+# Span builder address, polled for its queue of pending traces
+SPAN_BUILDER_URL = os.environ.get("NABU_SPAN_BUILDER_URL", "http://34.171.111.18:5200")
+SPAN_BUILDER_STATS_ROUTE = "/v3/stats"
+SPAN_BUILDER_MAX_PENDING_TRACES = 1000
+
+sampler = AdaptiveSampler(
+    target_traces_per_sec=TRACE_BUDGET_PER_SEC,
+    initial_rate=1 / SAMPLE_RATE,
+    max_queue_depth=SPAN_BUILDER_MAX_PENDING_TRACES,
+    max_traces_per_batch=TRACE_BUDGET_PER_SEC * SAMPLER_UPDATE_INTERVAL_IN_SEC,
+)
+
+# Event stream settings: how block content is sent ("full", "truncate" or "hash"),
+# and how many completed results are grouped into one flushed write
+SSE_CONTENT_MODE = CONTENT_MODE_FULL
+SSE_MAX_CONTENT_BYTES = 64 * 1024
+SSE_BATCH_SIZE = 32
+SSE_FLUSH_INTERVAL_IN_SEC = 0.1
+
+event_encoder = EventEncoder(content_mode=SSE_CONTENT_MODE, max_content_bytes=SSE_MAX_CONTENT_BYTES)
+
 # Traced requests counter
 REQUESTS_TRACED = 0
 
@@ -56,8 +85,8 @@ def get_ipfs_content():
         cid_list = [record.to_dict()["cid"] for record in cid_records]
         increment_counter("total_requests", len(cid_list))
         # Sample CIDs for tracing
-        nsamples = max(1, (len(cid_list) + SAMPLE_RATE - 1) // SAMPLE_RATE)
-        traced = random.sample(range(len(cid_list)), nsamples)
+        traced = sampler.sample(cid_list)
+        batcher = EventBatcher(max_events=SSE_BATCH_SIZE, flush_interval=SSE_FLUSH_INTERVAL_IN_SEC)
         with ThreadPoolExecutor(max_workers=512) as executor:
             future_to_cid = {
                 executor.submit(send_single_get_request, cid, i in traced): cid
@@ -66,23 +95,38 @@ def get_ipfs_content():
             try:
                 healthy_node_count = sum(1 for status in node_health_status.values() if status == "Healthy")
                 request_timeout = ((len(cid_list) + healthy_node_count - 1) // healthy_node_count) * TIMEOUT_IN_SEC
-                for future in as_completed(future_to_cid, timeout=request_timeout):
-                    cid = future_to_cid[future]
-                    try:
-                        status, response, node, trace, time_taken, trace_id = future.result()
-                        if trace:
-                            REQUESTS_TRACED += 1
-                        if status != 200:
-                            yield f'data: {{"error": "{response}", "node": "nabu-{node}", "trace": "{trace}", "trace_id": "{trace_id}", "time_taken": "{time_taken:.2f}s"}}\n\n'
-                        else:
-                            # Escape newlines
-                            escaped_response = response.replace("\n", "\\n").replace("\r", "\\r").replace("\"", "\\\"")
-                            yield f'data: {{"content": "{escaped_response}", "node": "nabu-{node}", "trace": "{trace}", "trace_id": "{trace_id}", "time_taken": "{time_taken:.2f}s"}}\n\n'
-                    except Exception as e:
-                        yield f'data: {{"error": "{str(e)}", "node": "nabu-{node}", "trace": "{trace}", "trace_id": "N/A", "time_taken": "N/A"}}\n\n'
+                deadline = time.monotonic() + request_timeout
+                pending = set(future_to_cid)
+                while pending:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError(f"{len(pending)} (of {len(future_to_cid)}) futures unfinished")
+                    # Wake up at least every flush interval so slow requests do not hold back finished results
+                    done, pending = wait(pending, timeout=min(SSE_FLUSH_INTERVAL_IN_SEC, remaining), return_when=FIRST_COMPLETED)
+                    for future in done:
+                        try:
+                            status, response, node, trace, time_taken, trace_id = future.result()
+                            if trace:
+                                REQUESTS_TRACED += 1
+                            if status != 200:
+                                event = event_encoder.error_event(response, node, trace, trace_id, time_taken)
+                            else:
+                                event = event_encoder.content_event(response, node, trace, trace_id, time_taken)
+                        except Exception as e:
+                            event = event_encoder.error_event(e, None, False, "N/A", "N/A")
+                        chunk = batcher.add(event)
+                        if chunk:
+                            yield chunk
+                    if not done or batcher.is_due():
+                        chunk = batcher.flush()
+                        if chunk:
+                            yield chunk
             except Exception as e:
                 # TimeoutError
-                yield f'data: {{"error": "{str(e)}", "node": "N/A", "{False}": "N/A", "trace_id": "N/A", "time_taken": "N/A"}}\n\n'
+                batcher.add(event_encoder.error_event(e, None, False, "N/A", "N/A"))
+            chunk = batcher.flush()
+            if chunk:
+                yield chunk
 
     return Response(generate(), mimetype="text/event-stream")
 
@@ -243,5 +287,31 @@ def increment_requests_traced():
 # Start the traced requests counter in a separate thread
 threading.Thread(target=increment_requests_traced, daemon=True).start()
 
+# Adjust the sampling rate from observed throughput and span builder queue depth
+def update_sample_rate():
+    stats_available = True
+    last_rate = None
+    while True:
+        try:
+            response = requests.get(SPAN_BUILDER_URL + SPAN_BUILDER_STATS_ROUTE, timeout=TIMEOUT_IN_SEC)
+            response.raise_for_status()
+            sampler.set_queue_depth(response.json().get("pending_traces", 0))
+            if not stats_available:
+                print(f"[{time.ctime()}] Span builder stats available again")
+                stats_available = True
+        except (requests.RequestException, ValueError) as e:
+            # Report an outage once rather than on every cycle
+            if stats_available:
+                print(f"[{time.ctime()}] Span builder stats unavailable ({type(e).__name__}), keeping last queue depth")
+                stats_available = False
+        rate = sampler.update()
+        if rate != last_rate:
+            print(f"[{time.ctime()}] Sampling rate set to {rate:.4f}")
+            last_rate = rate
+        time.sleep(SAMPLER_UPDATE_INTERVAL_IN_SEC)
+
+# Start the sampling rate updater in a separate thread
+threading.Thread(target=update_sample_rate, daemon=True).start()
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=80)
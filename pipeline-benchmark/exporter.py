@@ -0,0 +1,103 @@
+import os
+import threading
+import time
+
+import requests
+
+# Matches NabuLogExporter: poll delay between reads and the log file suffix
+LOG_EXPORT_POLL_DELAY_IN_SEC = 0.001
+LOG_FILE_IDENTIFIER = "trace.log"
+DIRECTORY_POLL_DELAY_IN_SEC = 0.05
+
+
+def parse_log(line):
+    # Same field mapping as NabuLogExporter.LogTask.parseLog
+    parts = line.split("\t")
+    if len(parts) == 7:
+        return {
+            "traceId": parts[0],
+            "nodeId": parts[1],
+            "peerNodeId": "",
+            "threadId": parts[2],
+            "timestamp": parts[3],
+            "eventType": parts[5],
+        }
+    elif len(parts) == 8:
+        return {
+            "traceId": parts[0],
+            "nodeId": parts[1],
+            "peerNodeId": parts[2],
+            "threadId": parts[3],
+            "timestamp": parts[4],
+            "eventType": parts[6],
+        }
+    return {}
+
+
+class LogExporter:
+    """
+    Python stand-in for nabu-log-exporter.
+
+    Tails every trace.log under log_dir with one thread per file and posts each
+    line to the span builder, the same way the Java exporter does. Records the
+    delay between a line being written and read (ipfs_node_to_exporter) and
+    the /v3/buildspan round trip (exporter_to_span_builder).
+    """
+
+    def __init__(self, log_dir, endpoint, metrics):
+        self.log_dir = log_dir
+        self.endpoint = endpoint
+        self.metrics = metrics
+        self._watched = set()
+        self._stop = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self._watch, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _watch(self):
+        while not self._stop.is_set():
+            for root, _, files in os.walk(self.log_dir):
+                for name in files:
+                    path = os.path.join(root, name)
+                    if path.endswith(LOG_FILE_IDENTIFIER) and path not in self._watched:
+                        self._watched.add(path)
+                        threading.Thread(target=self._tail, args=(path,), daemon=True).start()
+            time.sleep(DIRECTORY_POLL_DELAY_IN_SEC)
+
+    def _tail(self, path):
+        with open(path, "r", encoding="utf-8") as reader:
+            pending = ""
+            while not self._stop.is_set():
+                chunk = reader.readline()
+                if not chunk:
+                    time.sleep(LOG_EXPORT_POLL_DELAY_IN_SEC)
+                    continue
+                pending += chunk
+                if not pending.endswith("\n"):
+                    # Partial line, wait for the rest of it
+                    continue
+                self._export(pending.rstrip("\n"))
+                pending = ""
+
+    def _export(self, line):
+        log = parse_log(line)
+        if not log:
+            return
+        written = self.metrics.pop_log_written(log["traceId"], log["nodeId"], log["eventType"])
+        if written is not None:
+            self.metrics.record("ipfs_node_to_exporter", time.monotonic() - written)
+
+        self.metrics.mark_buildspan_post(log["traceId"])
+        start = time.monotonic()
+        try:
+            response = requests.post(self.endpoint, json=log)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            self.metrics.increment("exporter_errors")
+            print(f"Error exporting log to span builder: {e}")
+            return
+        self.metrics.record("exporter_to_span_builder", time.monotonic() - start)
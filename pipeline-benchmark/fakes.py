@@ -0,0 +1,357 @@
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+import types
+from datetime import datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+# IPFS routes served by the fake node, matching gateway/server.py
+PUT_ROUTE = "/api/v0/block/put"
+GET_ROUTE = "/api/v0/block/get"
+HEALTH_ROUTE = "/api/v0/healthz"
+
+# OTLP route served by the fake Jaeger collector
+OTLP_TRACES_ROUTE = "/v1/traces"
+
+# Events written for every traced block request: (node role, peer role, event type).
+# Roles: "client" is the node that received the request, "provider" answers the
+# provider lookup and "holder" serves the block over bitswap.
+TRACE_EVENTS = [
+    ("client", "provider", "GET_PROVIDERS_CLIENT_START"),
+    ("provider", "client", "GET_PROVIDERS_SERVER_START"),
+    ("provider", "client", "GET_PROVIDERS_SERVER_END"),
+    ("client", "provider", "GET_PROVIDERS_CLIENT_END"),
+    ("client", "holder", "BITSWAP_CLIENT_START"),
+    ("holder", "client", "BITSWAP_SERVER_START"),
+    ("holder", None, "READ_FROM_FILE_STORE_START"),
+    ("holder", None, "READ_FROM_FILE_STORE_END"),
+    ("holder", "client", "BITSWAP_SERVER_END"),
+    ("client", "holder", "BITSWAP_CLIENT_END"),
+]
+
+# Number of spans the span builder exports for one complete trace
+SPANS_PER_TRACE = len(TRACE_EVENTS) // 2
+
+
+class _QuietHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, body, content_type="application/json", headers=None):
+        data = body.encode("utf-8") if isinstance(body, str) else body
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return self.rfile.read(length) if length else b""
+
+
+class _Server:
+    """Runs a ThreadingHTTPServer on a free local port in a daemon thread."""
+
+    def __init__(self, handler):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class TraceLog:
+    """Append-only trace.log of one fake node, in the tab-separated Nabu format."""
+
+    def __init__(self, log_dir, node_id):
+        node_dir = os.path.join(log_dir, node_id)
+        os.makedirs(node_dir, exist_ok=True)
+        self.path = os.path.join(node_dir, "trace.log")
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def write(self, trace_id, node_id, peer_node_id, event_type, details):
+        now = time.time()
+        line = "\t".join([
+            trace_id,
+            node_id,
+            peer_node_id,
+            str(threading.get_ident()),
+            str(int(now * 1000)),
+            datetime.fromtimestamp(now).strftime("%Y-%m-%d %H:%M:%S.%f"),
+            event_type,
+            details,
+        ])
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class FakeIpfsCluster:
+    """
+    A set of fake Nabu nodes sharing one block store.
+
+    Each node serves the block put/get and health routes used by the gateway.
+    A traced get (trace=1) returns a Trace-id header and writes the full set of
+    TRACE_EVENTS to the trace logs of the client, provider and holder nodes,
+    spreading node_latency over the steps.
+    """
+
+    def __init__(self, nnodes, log_dir, metrics, node_latency=0.0):
+        if nnodes < 3:
+            raise ValueError("At least 3 nodes are needed to build a complete trace")
+        self.metrics = metrics
+        self.node_latency = node_latency
+        self.blocks = {}
+        self.node_ids = [f"nabu-{idx}" for idx in range(nnodes)]
+        self.logs = [TraceLog(log_dir, node_id) for node_id in self.node_ids]
+        self.servers = [_Server(self._make_handler(idx)) for idx in range(nnodes)]
+
+    @property
+    def urls(self):
+        return [server.url for server in self.servers]
+
+    def start(self):
+        for server in self.servers:
+            server.start()
+        return self
+
+    def stop(self):
+        for server in self.servers:
+            server.stop()
+        for log in self.logs:
+            log.close()
+
+    def put_block(self, content):
+        cid = "Qm" + hashlib.sha256(content).hexdigest()[:44]
+        self.blocks[cid] = content
+        return cid
+
+    def get_block(self, idx, cid, trace):
+        content = self.blocks.get(cid)
+        trace_id = None
+        if trace and content is not None:
+            # Derive the trace ID from the CID so runs are repeatable
+            trace_id = hashlib.md5(cid.encode("utf-8")).hexdigest()
+            self._write_trace(idx, cid, trace_id)
+        elif self.node_latency:
+            time.sleep(self.node_latency)
+        return content, trace_id
+
+    def _write_trace(self, idx, cid, trace_id):
+        nnodes = len(self.node_ids)
+        roles = {"client": idx, "provider": (idx + 1) % nnodes, "holder": (idx + 2) % nnodes}
+        step = self.node_latency / len(TRACE_EVENTS)
+        self.metrics.mark_trace_started(trace_id)
+        for role, peer_role, event_type in TRACE_EVENTS:
+            if step:
+                time.sleep(step)
+            node = roles[role]
+            node_id = self.node_ids[node]
+            peer_node_id = self.node_ids[roles[peer_role]] if peer_role else ""
+            self.logs[node].write(trace_id, node_id, peer_node_id, event_type, cid)
+            self.metrics.mark_log_written(trace_id, node_id, event_type)
+
+    def _make_handler(self, idx):
+        cluster = self
+
+        class Handler(_QuietHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path == HEALTH_ROUTE:
+                    self._reply(200, "{}")
+                elif url.path == GET_ROUTE:
+                    # Time from the request arriving to the reply being sent
+                    start = time.monotonic()
+                    query = parse_qs(url.query)
+                    cid = query.get("cid", [""])[0]
+                    trace = query.get("trace", ["0"])[0] == "1"
+                    content, trace_id = cluster.get_block(idx, cid, trace)
+                    if content is None:
+                        self._reply(404, json.dumps({"error": f"Block {cid} not found"}))
+                        return
+                    headers = {"Trace-id": trace_id} if trace_id else None
+                    self._reply(200, content, content_type="text/plain", headers=headers)
+                    cluster.metrics.record("ipfs_node", time.monotonic() - start)
+                else:
+                    self._reply(404, "{}")
+
+            def do_PUT(self):
+                if urlparse(self.path).path != PUT_ROUTE:
+                    self._reply(404, "{}")
+                    return
+                cid = cluster.put_block(self._read_body())
+                self._reply(200, json.dumps({"cid": cid}))
+
+        return Handler
+
+
+class FakeOtlpReceiver:
+    """Accepts OTLP/HTTP JSON trace exports, as Jaeger does on /v1/traces."""
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+        self.server = _Server(self._make_handler())
+
+    @property
+    def endpoint(self):
+        return self.server.url + OTLP_TRACES_ROUTE
+
+    def start(self):
+        self.server.start()
+        return self
+
+    def stop(self):
+        self.server.stop()
+
+    def _make_handler(self):
+        metrics = self.metrics
+
+        class Handler(_QuietHandler):
+            def do_POST(self):
+                if urlparse(self.path).path != OTLP_TRACES_ROUTE:
+                    self._reply(404, "{}")
+                    return
+                body = self._read_body()
+                metrics.increment("otlp_requests")
+                metrics.increment("otlp_bytes", len(body))
+                try:
+                    payload = json.loads(body)
+                    for resource_span in payload["resourceSpans"]:
+                        for scope_span in resource_span["scopeSpans"]:
+                            for span in scope_span["spans"]:
+                                metrics.mark_span_received(span["traceId"], span["spanId"])
+                except (ValueError, KeyError, TypeError) as e:
+                    self._reply(400, json.dumps({"error": str(e)}))
+                    return
+                self._reply(200, "{}")
+
+        return Handler
+
+
+def install_fake_firestore():
+    """
+    Register an in-memory stand-in for google.cloud.firestore, covering the
+    parts of the client used by the gateway. Must be called before the
+    gateway is imported. Returns the fake module.
+    """
+    store = {}
+    store_lock = threading.Lock()
+
+    class Increment:
+        def __init__(self, amount):
+            self.amount = amount
+
+    class DocumentSnapshot:
+        def __init__(self, reference, data):
+            self.reference = reference
+            self._data = data
+
+        @property
+        def exists(self):
+            return self._data is not None
+
+        def to_dict(self):
+            return dict(self._data) if self._data is not None else None
+
+    class DocumentReference:
+        def __init__(self, collection, doc_id):
+            self.collection = collection
+            self.id = doc_id
+
+        def get(self):
+            with store_lock:
+                data = store.get(self.collection, {}).get(self.id)
+            return DocumentSnapshot(self, data)
+
+        def set(self, data):
+            with store_lock:
+                store.setdefault(self.collection, {})[self.id] = dict(data)
+
+        def update(self, data):
+            with store_lock:
+                doc = store.setdefault(self.collection, {}).setdefault(self.id, {})
+                for key, value in data.items():
+                    if isinstance(value, Increment):
+                        doc[key] = doc.get(key, 0) + value.amount
+                    else:
+                        doc[key] = value
+
+        def delete(self):
+            with store_lock:
+                store.get(self.collection, {}).pop(self.id, None)
+
+    class CollectionReference:
+        def __init__(self, name):
+            self.name = name
+
+        def document(self, doc_id):
+            return DocumentReference(self.name, doc_id)
+
+        def add(self, data):
+            ref = DocumentReference(self.name, os.urandom(10).hex())
+            ref.set(data)
+            return None, ref
+
+        def stream(self):
+            with store_lock:
+                docs = list(store.get(self.name, {}).items())
+            for doc_id, data in docs:
+                yield DocumentSnapshot(DocumentReference(self.name, doc_id), data)
+
+    class WriteBatch:
+        def __init__(self):
+            self._deletes = []
+
+        def delete(self, reference):
+            self._deletes.append(reference)
+
+        def commit(self):
+            for reference in self._deletes:
+                reference.delete()
+            self._deletes = []
+
+    class Client:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def collection(self, name):
+            return CollectionReference(name)
+
+        def batch(self):
+            return WriteBatch()
+
+    firestore = types.ModuleType("google.cloud.firestore")
+    firestore.Client = Client
+    firestore.Increment = Increment
+    firestore.store = store
+
+    try:
+        import google.cloud as cloud
+    except ImportError:
+        google = sys.modules.setdefault("google", types.ModuleType("google"))
+        cloud = types.ModuleType("google.cloud")
+        google.cloud = cloud
+        sys.modules["google.cloud"] = cloud
+    cloud.firestore = firestore
+    sys.modules["google.cloud.firestore"] = firestore
+    return firestore
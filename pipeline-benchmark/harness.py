@@ -0,0 +1,305 @@
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from werkzeug.serving import make_server
+
+from exporter import LogExporter
+from fakes import FakeIpfsCluster, FakeOtlpReceiver, SPANS_PER_TRACE, install_fake_firestore
+from metrics import Metrics
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GATEWAY_DIR = os.path.join(REPO_ROOT, "gateway")
+SPAN_BUILDER_DIR = os.path.join(REPO_ROOT, "span-builder")
+
+# Hops reported in order along the pipeline
+HOPS = [
+    "gateway_put",
+    "gateway_to_ipfs_node",
+    "ipfs_node",
+    "ipfs_node_to_exporter",
+    "exporter_to_span_builder",
+    "span_builder_to_jaeger",
+    "end_to_end",
+]
+
+# Metrics compared against a baseline: (path into the results, higher is better)
+REGRESSION_CHECKS = [
+    (("stream", "events_per_sec"), True),
+    (("hops", "end_to_end", "p95_ms"), False),
+    (("hops", "exporter_to_span_builder", "p95_ms"), False),
+    (("hops", "span_builder_to_jaeger", "p95_ms"), False),
+    (("hops", "ipfs_node", "p95_ms"), False),
+]
+
+
+class _AppServer:
+    """Serves a Flask app on a free local port in a daemon thread."""
+
+    def __init__(self, app):
+        self.httpd = make_server("127.0.0.1", 0, app, threaded=True)
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+
+
+class _ResourceSampler:
+    """Samples the peak thread count of the process while the benchmark runs."""
+
+    def __init__(self, interval=0.1):
+        self.interval = interval
+        self.peak_threads = threading.active_count()
+        self._stop = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak_threads = max(self.peak_threads, threading.active_count())
+            time.sleep(self.interval)
+
+
+def start_services(args, metrics, run_dir):
+    """Start the fakes plus the real span builder and gateway, wired together."""
+    install_fake_firestore()
+    cluster = FakeIpfsCluster(args.nodes, os.path.join(run_dir, "logs"), metrics, args.node_latency_ms / 1000).start()
+    otlp = FakeOtlpReceiver(metrics).start()
+
+    # Both services read their endpoints at import time
+    os.environ["JAEGER_ENDPOINT"] = otlp.endpoint
+    sys.path.insert(0, SPAN_BUILDER_DIR)
+    import service
+    span_builder = _AppServer(service.app).start()
+
+    os.environ["NABU_IPFS_URLS"] = ",".join(cluster.urls)
+    os.environ["NABU_SPAN_BUILDER_URL"] = span_builder.url
+    sys.path.insert(0, GATEWAY_DIR)
+    import server
+    from sampler import AdaptiveSampler
+    if not args.adaptive:
+        # A fixed rate keeps the traced CIDs identical across runs
+        rate = 1 / args.sample_rate
+        server.sampler = AdaptiveSampler(server.TRACE_BUDGET_PER_SEC, initial_rate=rate, min_rate=rate, max_rate=rate)
+    gateway = _AppServer(server.app).start()
+
+    exporter = LogExporter(os.path.join(run_dir, "logs"), span_builder.url + "/v3/buildspan", metrics).start()
+
+    deadline = time.monotonic() + args.startup_timeout
+    while any(status != "Healthy" for status in server.node_health_status.values()):
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"IPFS nodes not healthy: {server.node_health_status}")
+        time.sleep(0.1)
+
+    return [exporter, gateway, span_builder, otlp, cluster], gateway.url
+
+
+def put_blocks(gateway_url, args, metrics):
+    rng = random.Random(args.seed)
+    blocks = [rng.randbytes(args.block_size // 2).hex() for _ in range(args.cids)]
+
+    def put(block):
+        start = time.monotonic()
+        response = requests.put(gateway_url + "/ipfs", data=block)
+        response.raise_for_status()
+        metrics.record("gateway_put", time.monotonic() - start)
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        list(executor.map(put, blocks))
+
+
+def stream_blocks(gateway_url, metrics):
+    events = 0
+    errors = 0
+    bytes_received = 0
+    trace_ids = set()
+    start = time.monotonic()
+    with requests.get(gateway_url + "/ipfs", stream=True) as response:
+        response.raise_for_status()
+        for line in response.iter_lines(decode_unicode=True):
+            bytes_received += len(line) + 1
+            if not line.startswith("data: "):
+                continue
+            event = json.loads(line[len("data: "):])
+            events += 1
+            if "error" in event:
+                errors += 1
+                continue
+            # time_taken is rounded to 10 ms by the gateway, so this hop is
+            # reported but not used for regression checks
+            if event["time_taken"] != "N/A":
+                metrics.record("gateway_to_ipfs_node", float(event["time_taken"].rstrip("s")))
+            if event["trace"] == "True":
+                trace_ids.add(event["trace_id"])
+    duration = time.monotonic() - start
+    return {
+        "events": events,
+        "errors": errors,
+        "traced": len(trace_ids),
+        "bytes": bytes_received,
+        "duration_sec": duration,
+        "events_per_sec": events / duration if duration > 0 else None,
+    }, trace_ids
+
+
+def wait_for_traces(trace_ids, metrics, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if trace_ids <= metrics.completed_traces(SPANS_PER_TRACE):
+            break
+        time.sleep(0.1)
+    completed = trace_ids & metrics.completed_traces(SPANS_PER_TRACE)
+    for trace_id in completed:
+        received = max(metrics.spans_received[trace_id].values())
+        metrics.record("end_to_end", received - metrics.trace_started[trace_id], at=received)
+    return len(completed)
+
+
+def run(args):
+    metrics = Metrics()
+    run_dir = tempfile.mkdtemp(prefix="nabu-bench-")
+    # The span builder writes app.log to the working directory
+    os.chdir(run_dir)
+
+    services, gateway_url = start_services(args, metrics, run_dir)
+    usage_before = resource.getrusage(resource.RUSAGE_SELF)
+    sampler = _ResourceSampler().start()
+    start = time.monotonic()
+
+    put_blocks(gateway_url, args, metrics)
+    stream, trace_ids = stream_blocks(gateway_url, metrics)
+    completed = wait_for_traces(trace_ids, metrics, args.drain_timeout)
+
+    wall = time.monotonic() - start
+    sampler.stop()
+    usage_after = resource.getrusage(resource.RUSAGE_SELF)
+    for service in services:
+        service.stop()
+
+    return {
+        "config": vars(args),
+        "run_dir": run_dir,
+        "wall_sec": wall,
+        "stream": stream,
+        "traces": {
+            "sampled": len(trace_ids),
+            "completed": completed,
+            "otlp_requests": metrics.counters.get("otlp_requests", 0),
+            "otlp_bytes": metrics.counters.get("otlp_bytes", 0),
+            "exporter_errors": metrics.counters.get("exporter_errors", 0),
+        },
+        "hops": {hop: metrics.summarize_hop(hop) for hop in HOPS},
+        "resources": {
+            "cpu_user_sec": usage_after.ru_utime - usage_before.ru_utime,
+            "cpu_system_sec": usage_after.ru_stime - usage_before.ru_stime,
+            # ru_maxrss is in kilobytes on Linux
+            "peak_rss_mb": usage_after.ru_maxrss / 1024,
+            "peak_threads": sampler.peak_threads,
+        },
+    }
+
+
+def _lookup(results, path):
+    for key in path:
+        if not isinstance(results, dict) or key not in results:
+            return None
+        results = results[key]
+    return results
+
+
+def find_regressions(results, baseline, tolerance):
+    regressions = []
+    for path, higher_is_better in REGRESSION_CHECKS:
+        current, previous = _lookup(results, path), _lookup(baseline, path)
+        if current is None or not previous:
+            continue
+        change = (current - previous) / previous
+        if (higher_is_better and change < -tolerance) or (not higher_is_better and change > tolerance):
+            regressions.append(f"{'.'.join(path)}: {previous:.2f} -> {current:.2f} ({change:+.0%})")
+    return regressions
+
+
+def print_report(results):
+    stream = results["stream"]
+    traces = results["traces"]
+    res = results["resources"]
+    print()
+    print(f"Gateway stream: {stream['events']} events ({stream['errors']} errors) in {stream['duration_sec']:.2f}s, "
+          f"{stream['events_per_sec']:.0f} events/s, {stream['bytes']} bytes")
+    print(f"Traces: {traces['completed']}/{traces['sampled']} complete, "
+          f"{traces['otlp_requests']} OTLP requests, {traces['exporter_errors']} exporter errors")
+    print()
+    print(f"{'hop':<26} {'count':>8} {'per sec':>10} {'mean ms':>10} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}")
+    for hop, summary in results["hops"].items():
+        if not summary["count"]:
+            print(f"{hop:<26} {0:>8}")
+            continue
+        per_sec = summary["throughput_per_sec"]
+        print(f"{hop:<26} {summary['count']:>8} {per_sec if per_sec is not None else 0:>10.1f} "
+              f"{summary['mean_ms']:>10.2f} {summary['p50_ms']:>10.2f} {summary['p95_ms']:>10.2f} {summary['p99_ms']:>10.2f}")
+    print()
+    print(f"Total: {results['wall_sec']:.2f}s wall, {res['cpu_user_sec']:.2f}s user CPU, {res['cpu_system_sec']:.2f}s system CPU, "
+          f"{res['peak_rss_mb']:.0f} MB peak RSS, {res['peak_threads']} peak threads")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end benchmark of the Nabu tracing pipeline against local fakes")
+    parser.add_argument("--cids", type=int, default=1000, help="Number of blocks to put and then fetch")
+    parser.add_argument("--block-size", type=int, default=1024, help="Block size in bytes")
+    parser.add_argument("--nodes", type=int, default=3, help="Number of fake IPFS nodes")
+    parser.add_argument("--node-latency-ms", type=float, default=5, help="Simulated latency of a block get")
+    parser.add_argument("--sample-rate", type=int, default=10, help="Trace 1 in SAMPLE_RATE CIDs")
+    parser.add_argument("--adaptive", action="store_true", help="Use the gateway's adaptive sampler instead of a fixed rate")
+    parser.add_argument("--concurrency", type=int, default=32, help="Parallel block puts")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the generated block contents")
+    parser.add_argument("--startup-timeout", type=float, default=30)
+    parser.add_argument("--drain-timeout", type=float, default=60, help="Seconds to wait for sampled traces to reach the OTLP receiver")
+    parser.add_argument("--output", type=str, help="Write results as JSON to this file")
+    parser.add_argument("--baseline", type=str, help="Compare against results JSON from an earlier run")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative change before a metric counts as a regression")
+    args = parser.parse_args()
+
+    for option in ("output", "baseline"):
+        if getattr(args, option):
+            setattr(args, option, os.path.abspath(getattr(args, option)))
+
+    results = run(args)
+    print_report(results)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = find_regressions(results, baseline, args.tolerance)
+        if regressions:
+            print("Regressions against baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("No regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import threading
+import time
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[idx]
+
+
+class Metrics:
+    """
+    Thread-safe store for everything the fakes and the harness measure.
+
+    Latencies are recorded per hop together with the time they were taken,
+    so each hop reports both its latency distribution and its throughput.
+    All times come from time.monotonic().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}
+        self.counters = {}
+        # (trace_id, node_id, event_type) -> time the log line was written
+        self.log_written = {}
+        # trace_id -> time the traced block request reached the IPFS node
+        self.trace_started = {}
+        # trace_id -> time of the latest /v3/buildspan post for that trace
+        self.last_buildspan_post = {}
+        # trace_id -> {span_id: time received by the OTLP receiver}
+        self.spans_received = {}
+
+    def record(self, hop, latency, at=None):
+        at = time.monotonic() if at is None else at
+        with self._lock:
+            self.samples.setdefault(hop, []).append((at, latency))
+
+    def increment(self, counter, amount=1):
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def mark_log_written(self, trace_id, node_id, event_type):
+        with self._lock:
+            self.log_written[(trace_id, node_id, event_type)] = time.monotonic()
+
+    def mark_trace_started(self, trace_id):
+        with self._lock:
+            self.trace_started.setdefault(trace_id, time.monotonic())
+
+    def mark_buildspan_post(self, trace_id):
+        with self._lock:
+            self.last_buildspan_post[trace_id] = time.monotonic()
+
+    def mark_span_received(self, trace_id, span_id):
+        now = time.monotonic()
+        with self._lock:
+            self.spans_received.setdefault(trace_id, {}).setdefault(span_id, now)
+            posted = self.last_buildspan_post.get(trace_id)
+        if posted is not None:
+            self.record("span_builder_to_jaeger", now - posted, at=now)
+
+    def pop_log_written(self, trace_id, node_id, event_type):
+        with self._lock:
+            return self.log_written.pop((trace_id, node_id, event_type), None)
+
+    def completed_traces(self, spans_per_trace):
+        with self._lock:
+            return {
+                trace_id for trace_id, spans in self.spans_received.items()
+                if len(spans) >= spans_per_trace
+            }
+
+    def summarize_hop(self, hop):
+        with self._lock:
+            samples = list(self.samples.get(hop, []))
+        if not samples:
+            return {"count": 0}
+        times = [at for at, _ in samples]
+        latencies = [latency for _, latency in samples]
+        window = max(times) - min(times)
+        return {
+            "count": len(samples),
+            "throughput_per_sec": len(samples) / window if window > 0 else None,
+            "mean_ms": 1000 * sum(latencies) / len(latencies),
+            "p50_ms": 1000 * percentile(latencies, 50),
+            "p95_ms": 1000 * percentile(latencies, 95),
+            "p99_ms": 1000 * percentile(latencies, 99),
+            "max_ms": 1000 * max(latencies),
+        }
@@ -0,0 +1,71 @@
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import timeit
+
+# Importing service opens app.log in the working directory, so keep it out of the source tree
+os.chdir(tempfile.mkdtemp(prefix="nabu-span-ids-"))
+
+import service
+from constants import *
+
+# Span keys of one complete trace, matching sendSampleLogs.py
+SPAN_KEYS = [
+    ("node1", "node2", GET_PROVIDERS_SERVER),
+    ("node2", "node1", GET_PROVIDERS_CLIENT),
+    ("node2", "node3", BITSWAP_CLIENT),
+    ("node3", "node2", BITSWAP_SERVER),
+    ("node3", "", READ_FROM_FILE_STORE),
+]
+
+
+def legacy_span_ids(trace_id):
+    # Before caching, every event hashed each span in build_parent_child_spans
+    # and again in the export loop of build_span_v3
+    for _ in range(2):
+        for node_id, peer_node_id, span_name in SPAN_KEYS:
+            service._hash_span_id_md5(f"{trace_id}_{node_id}_{peer_node_id}_{span_name}".encode("utf-8"))
+
+
+def cached_span_ids(trace_id):
+    span_ids = service.data_store[trace_id]["span_ids"]
+    for key in SPAN_KEYS:
+        span_ids[key]
+
+
+def per_call_us(func, number):
+    return 1e6 * min(timeit.repeat(func, number=number, repeat=5)) / number
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", type=int, default=20000)
+    args = parser.parse_args()
+
+    trace_id = os.urandom(16).hex()
+    service.data_store[trace_id] = {"creation": None, "data": {}, "span_ids": {}, "exported": False}
+    for key in SPAN_KEYS:
+        service.data_store[trace_id]["data"][key] = {Stage.START.name: 1, Stage.END.name: 2}
+        service.data_store[trace_id]["span_ids"][key] = service.construct_span_id_from_span(trace_id, *key)
+
+    print(f"Span ID work per event for a {len(SPAN_KEYS)}-span trace:")
+    print(f"  md5 per span, twice per event (before): {per_call_us(lambda: legacy_span_ids(trace_id), args.number):8.2f} us")
+    print(f"  cached span IDs (after):                {per_call_us(lambda: cached_span_ids(trace_id), args.number):8.2f} us")
+
+    print("Deriving one span ID:")
+    data = f"{trace_id}_node3_node2_{BITSWAP_SERVER}".encode("utf-8")
+    for name, hash_span_id in service.SPAN_ID_HASHES.items():
+        if name == "fast" and service.xxhash is None:
+            print(f"  {name:<38} skipped, xxhash is not installed")
+            continue
+        print(f"  {name:<38} {per_call_us(lambda: hash_span_id(data), args.number):8.2f} us")
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        build_us = per_call_us(lambda: service.build_parent_child_spans(trace_id), args.number // 10)
+    print(f"build_parent_child_spans per event (after): {build_us:.2f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,14 @@
 from enum import Enum
+import os
 
 # Jaeger Config
-JAEGER_ENDPOINT = "http://34.67.248.229:4318/v1/traces"
+JAEGER_ENDPOINT = os.environ.get("JAEGER_ENDPOINT", "http://34.67.248.229:4318/v1/traces")
 SERVICE_NAME = "nabu"
 
+# Hash used to derive span IDs: "md5" keeps IDs compatible with earlier
+# releases, "fast" uses the 64-bit non-cryptographic xxh3 hash from xxhash
+SPAN_ID_HASH = os.environ.get("SPAN_ID_HASH", "md5")
+
 # Keys to parse JSON from Daemon processor
 RAW_LOG_TRACE_ID_KEY = "traceId"
 RAW_LOG_SPAN_ID_KEY = "spanId"  # TODO: Ideally, this comes from daemon process
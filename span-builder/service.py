@@ -10,6 +10,11 @@ import hashlib
 from constants import *
 from datetime import datetime, timedelta
 
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
@@ -28,6 +33,9 @@ data_store = {}
 data_store_locks = defaultdict(threading.Lock)
 spans_sent = []
 
+# How long a trace is kept, and counted as pending while it is not exported
+TRACE_TTL = timedelta(minutes=2)
+
 
 class JaegerPostError(Exception):
     pass
@@ -47,7 +55,7 @@ def is_trace_complete_v2(trace_id: str) -> bool:
 
 class Span:
     def __init__(self, span_id: str ,node_id: str, type: str, start_time: int, end_time: int, peer_node_id: str, parent_id: str):
-        self.span_id = ""
+        self.span_id = span_id
         self.node_id = node_id
         self.peer_node_id = peer_node_id
         self.type = type
@@ -56,10 +64,31 @@ class Span:
         self.parent_id = parent_id
 
 
+def _hash_span_id_md5(data: bytes) -> str:
+    return hashlib.md5(data).hexdigest()[:16]
+
+
+def _hash_span_id_fast(data: bytes) -> str:
+    return xxhash.xxh3_64_hexdigest(data)
+
+
+SPAN_ID_HASHES = {
+    "md5": _hash_span_id_md5,
+    "fast": _hash_span_id_fast,
+}
+
+if SPAN_ID_HASH not in SPAN_ID_HASHES:
+    raise ValueError(f"Unknown span ID hash: {SPAN_ID_HASH}")
+
+if SPAN_ID_HASH == "fast" and xxhash is None:
+    raise ValueError("SPAN_ID_HASH=fast requires the xxhash package")
+
+_hash_span_id = SPAN_ID_HASHES[SPAN_ID_HASH]
+
+
 def construct_span_id_from_span(trace_id, node_id, peer_node_id, span_name):
     span_id = f"{trace_id}_{node_id}_{peer_node_id}_{span_name}"
-    span_id = hashlib.md5(span_id.encode('utf-8')).hexdigest()[:16]
-    return span_id
+    return _hash_span_id(span_id.encode('utf-8'))
 
 
 def build_parent_child_spans(trace_id: str):
@@ -73,6 +102,7 @@ def build_parent_child_spans(trace_id: str):
         return -1
 
     trace = data_store[trace_id]["data"]
+    span_ids = data_store[trace_id]["span_ids"]
 
     # Stage is either 'start' or 'end'
     for k, stages in trace.items():
@@ -85,7 +115,7 @@ def build_parent_child_spans(trace_id: str):
         node_id, peer_node_id, _type = k
 
         span = Span(
-            span_id = construct_span_id_from_span(trace_id, node_id, peer_node_id, _type),
+            span_id=span_ids[k],
             node_id=node_id,
             type=_type,
             start_time=start,
@@ -186,11 +216,16 @@ def build_span_v3():
     print(f"Received trace event from {request.remote_addr} at {human_timestamp}: {trace_id}, node {node_id}, thread N/A, {span_name}_{stage} {stage}")
 
     if trace_id not in data_store:
-        data_store[trace_id] = {"creation": datetime.now(), "data": {}}
+        data_store[trace_id] = {"creation": datetime.now(), "data": {}, "span_ids": {}, "exported": False}
     trace = data_store[trace_id]["data"]
 
     key = (node_id, peer_node_id, span_name)
 
+    # Span IDs are derived once per span and reused on every later event
+    span_ids = data_store[trace_id]["span_ids"]
+    if key not in span_ids:
+        span_ids[key] = construct_span_id_from_span(trace_id, node_id, peer_node_id, span_name)
+
     span = trace.setdefault(key, {})
     span[stage] = timestamp
     print(f"Setting {key} {stage} to {timestamp}")
@@ -200,12 +235,7 @@ def build_span_v3():
     if spans and len(spans):
         try:
             for span in spans:
-                span_id = construct_span_id_from_span(
-                    trace_id=trace_id,
-                    node_id=span.node_id,
-                    peer_node_id=span.peer_node_id,
-                    span_name=span.type
-                )
+                span_id = span.span_id
 
                 if span_id in spans_sent:
                     continue
@@ -230,8 +260,10 @@ def build_span_v3():
                 if len(spans_sent) > 10000:
                     spans_sent.pop(0)
 
+            data_store[trace_id]["exported"] = True
+
             # Keep a trace for at most 2 minutes to prevent memory leak
-            if datetime.now() - data_store[trace_id]["creation"] >= timedelta(minutes=2):
+            if datetime.now() - data_store[trace_id]["creation"] >= TRACE_TTL:
                 del data_store[trace_id]
         except Exception as exc:
             return jsonify({ 'error': str(exc)}), 500
@@ -239,6 +271,19 @@ def build_span_v3():
     return jsonify(), 200
 
 
+# Report queue depth so the gateway can adjust its sampling rate
+@app.route("/v3/stats", methods=["GET"])
+def get_stats():
+    # Only traces still waiting to be exported count; exported traces and
+    # incomplete ones older than TRACE_TTL are not part of the backlog
+    now = datetime.now()
+    pending_traces = sum(
+        1 for trace in list(data_store.values())
+        if not trace["exported"] and now - trace["creation"] < TRACE_TTL
+    )
+    return jsonify({"pending_traces": pending_traces, "spans_sent": len(spans_sent)}), 200
+
+
 def _extract_event_info(event: str):
     return event.rsplit('_', 1)
 